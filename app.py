@@ -1,26 +1,92 @@
+import hashlib
+import io
+import os
+import time
+
+import httpx
+import numpy as np
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
+from joblib import Parallel, delayed
+from plotly_resampler import FigureResampler
 from prophet import Prophet
+from prophet.serialize import model_to_json, model_from_json
 
 # ------------------------
 # Carregar dados
 # ------------------------
 SHEET_CSV = "https://docs.google.com/spreadsheets/d/e/2PACX-1vS7OOWK8wX0B9ulh_Vtmv-R_pbVREiwknncX8oSvnZ4o5wf00gcFhyEEgo3kxW0PmturRda4wL5OCNn/pub?gid=145140176&single=true&output=csv"
 
-@st.cache_data(ttl=300)
-def load_data(url):
-    df = pd.read_csv(url)
+# Snapshot Parquet em disco: sobrevive a reinícios do processo e evita
+# re-baixar a planilha a cada cold start dentro do TTL
+_SHEET_SNAPSHOT = "/tmp/reservas.parquet"
+_SHEET_ETAG = _SHEET_SNAPSHOT + ".etag"
+_SHEET_TTL = 300
+
+# Cliente HTTP persistente: reusa a conexão TLS entre refreshes do TTL
+# em vez de pagar o handshake do urllib a cada download
+_http = httpx.Client(timeout=30.0, follow_redirects=True)
+
+@st.cache_resource(ttl=_SHEET_TTL, show_spinner=False)
+def _load_parquet_bytes(url):
+    # Baixa e parseia o CSV uma vez e guarda um snapshot Parquet em
+    # memória; reidratar Parquet é ~10x mais barato que re-parsear texto
+    try:
+        if time.time() - os.path.getmtime(_SHEET_SNAPSHOT) < _SHEET_TTL:
+            with open(_SHEET_SNAPSHOT, "rb") as f:
+                return f.read()
+    except OSError:
+        pass
+    # Revalidação por ETag: se a planilha não mudou desde o último
+    # download, um 304 reaproveita o snapshot sem re-parsear nada
+    headers = {}
+    try:
+        if os.path.exists(_SHEET_SNAPSHOT):
+            with open(_SHEET_ETAG) as f:
+                headers["If-None-Match"] = f.read().strip()
+    except OSError:
+        pass
+    r = _http.get(url, headers=headers)
+    if r.status_code == 304:
+        os.utime(_SHEET_SNAPSHOT)
+        with open(_SHEET_SNAPSHOT, "rb") as f:
+            return f.read()
+    r.raise_for_status()
+    # engine="pyarrow": parse multi-thread em C++ em vez do tokenizador
+    # single-thread do engine C
+    df = pd.read_csv(io.BytesIO(r.content), engine="pyarrow")
     # Se a planilha vier com Mês/Ano e Tentativa de Reserva, renomeie para ds/y
     if "Mês/Ano" in df.columns and "Tentativa de Reserva" in df.columns:
         df = df.rename(columns={"Mês/Ano": "ds", "Tentativa de Reserva": "y"})
-    # ds -> datetime
+    # ds -> datetime, com Year/Month materializados uma única vez
+    # (evita repetir o kernel .dt.year em cada rerun)
     if "ds" in df.columns:
         df["ds"] = pd.to_datetime(df["ds"], errors="coerce")
-    # y -> numérica (inteiro)
+        df["Year"] = df["ds"].dt.year.astype("Int16")
+        df["Month"] = df["ds"].dt.month.astype("Int8")
+    # y -> numérica (inteiro); Int32 basta para contagens mensais e
+    # corta pela metade os bytes percorridos em groupby/sum
     if "y" in df.columns:
-        df["y"] = pd.to_numeric(df["y"], errors="coerce").astype('Int64')
-    return df
+        df["y"] = pd.to_numeric(df["y"], errors="coerce").astype('Int32')
+    # UF como categórica: comparações e groupby passam a usar códigos
+    # inteiros em vez de strings
+    if "UF" in df.columns:
+        df["UF"] = df["UF"].astype("category")
+    data = df.to_parquet(index=False)
+    try:
+        with open(_SHEET_SNAPSHOT, "wb") as f:
+            f.write(data)
+        if r.headers.get("ETag"):
+            with open(_SHEET_ETAG, "w") as f:
+                f.write(r.headers["ETag"])
+    except OSError:
+        pass
+    return data
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_data(url):
+    return pd.read_parquet(io.BytesIO(_load_parquet_bytes(url)))
 
 df = load_data(SHEET_CSV)
 
@@ -29,19 +95,21 @@ if "UF" not in df.columns:
     st.error("Coluna UF não encontrada nos dados.")
     st.stop()
 
+# Fatiar por UF uma única vez (evita um scan booleano completo por laço)
+uf_groups = {uf: g[["ds","y"]].sort_values("ds") for uf, g in df.groupby("UF", sort=False, observed=True)}
+
 # ------------------------
 # Funções utilitárias
 # ------------------------
-def mes_br_port(dt):
-    # representa mês/ano em formato curto (jan/2025)
-    month_names = {
-        1: "jan", 2: "fev", 3: "mar", 4: "abr",
-        5: "mai", 6: "jun", 7: "jul", 8: "ago",
-        9: "set", 10: "out", 11: "nov", 12: "dez"
-    }
-    m = int(dt.month)
-    y = dt.year
-    return f"{month_names[m]}/{y}"
+_MONTHS_BR = np.array(["jan", "fev", "mar", "abr", "mai", "jun",
+                       "jul", "ago", "set", "out", "nov", "dez"])
+
+def mes_br_port(ds):
+    # representa mês/ano em formato curto (jan/2025) para uma Series
+    # datetime inteira de uma vez (vetorizado, sem loop por linha)
+    ds = pd.to_datetime(ds)
+    labels = np.char.add(_MONTHS_BR[ds.dt.month.to_numpy() - 1], "/")
+    return np.char.add(labels, ds.dt.year.astype(str).to_numpy())
 
 # ------------------------
 # Título
@@ -51,97 +119,190 @@ st.title("Tentativa de Reservas + Tendência")
 # ------------------------
 # Sidebar: UF + Período
 # ------------------------
-ufs = sorted(df["UF"].dropna().unique())
+# As categorias já vêm ordenadas e sem NaN — dispensa sorted/dropna/unique
+ufs = df["UF"].cat.categories.tolist()
 ufs_selected = st.sidebar.multiselect("Selecione os estados (UF)", ufs, default=ufs[:1])
 
 start_date = st.sidebar.date_input("Data inicial", df["ds"].min())
 end_date = st.sidebar.date_input("Data final", df["ds"].max())
 horizon = st.sidebar.slider("Meses a projetar", 1, 24, 12)
+calc_ranking = st.sidebar.checkbox("Computar ranking nacional projetado", value=False)
 
-# Filtrar dados por UF(s) e período
-df_uf = df[(df["UF"].isin(ufs_selected)) & (df["ds"] >= pd.to_datetime(start_date)) & (df["ds"] <= pd.to_datetime(end_date))]
+# Converter as datas dos widgets uma única vez por rerun
+start_ts = pd.to_datetime(start_date)
+end_ts = pd.to_datetime(end_date)
 
 # ------------------------
 # Feriados nacionais + férias escolares
 # ------------------------
-feriados_nacionais = pd.DataFrame({
-    'holiday': ['Confraternização', 'Carnaval', 'Paixão de Cristo', 'Tiradentes', 'Dia do Trabalho', 'Corpus Christi', 'Independência', 'Nossa Senhora Aparecida', 'Finados', 'Proclamação da República'],
-    'ds': pd.to_datetime(['2023-01-01','2023-02-20','2023-04-07','2023-04-21','2023-05-01', '2023-06-08','2023-09-07','2023-10-12','2023-11-02','2023-11-15']),
-    'lower_window': 0,
-    'upper_window': 1
-})
-ferias_escolares = pd.DataFrame({
-    'holiday': ['Férias Escolares', 'Férias Escolares'],
-    'ds': pd.to_datetime(['2023-07-01', '2023-12-01']),
-    'lower_window': [0, 0],
-    'upper_window': [30, 61]
-})
-feriados = pd.concat([feriados_nacionais, ferias_escolares])
+@st.cache_data(show_spinner=False)
+def build_feriados():
+    # Dados fixos: montar (e parsear as datas) uma única vez por sessão.
+    # Um único frame contíguo com janelas int32 — sem concat de frames
+    # de dtypes mistos, então a validação interna do Prophet não reindexa
+    return pd.DataFrame({
+        'holiday': ['Confraternização', 'Carnaval', 'Paixão de Cristo', 'Tiradentes', 'Dia do Trabalho', 'Corpus Christi', 'Independência', 'Nossa Senhora Aparecida', 'Finados', 'Proclamação da República', 'Férias Escolares', 'Férias Escolares'],
+        'ds': pd.to_datetime(['2023-01-01','2023-02-20','2023-04-07','2023-04-21','2023-05-01', '2023-06-08','2023-09-07','2023-10-12','2023-11-02','2023-11-15', '2023-07-01', '2023-12-01']),
+        'lower_window': np.zeros(12, dtype='int32'),
+        'upper_window': np.array([1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 30, 61], dtype='int32')
+    })
+
+feriados = build_feriados()
 
 # ------------------------
 # Projeção por UF (pré-calc na inicialização) + cache
 # ------------------------
-def compute_projection_all(all_uf, horizon, feriados):
+# Fits serializados em disco: sobrevivem à eviction do cache em memória
+# (reinício do worker no Streamlit Cloud) sem refazer o Stan
+_PROPHET_CACHE_DIR = ".prophet_cache"
+
+# Memo por processo: os workers do loky persistem entre chamadas, então
+# mudar só o horizon reutiliza o modelo já carregado (o fit não depende
+# do horizon; apenas o predict é refeito)
+_MODEL_MEMO = {}
+
+def _fit_one(uf, df_u, horizon, feriados):
+    # Ajusta o Prophet para uma UF e devolve (uf, soma 2025, mensal 2025).
+    # Função de módulo para ser picklável pelos workers do loky.
+    # .assign produz a única cópia necessária (o slice original é só lido)
+    df_u = df_u.assign(y=df_u["y"].astype(float))
+    # Séries triviais (poucos pontos ou constantes) não justificam um
+    # fit do Stan: projeta a média dos últimos meses direto
+    if len(df_u) < 6 or df_u["y"].nunique() == 1:
+        media = np.float32(df_u["y"].tail(3).mean())
+        future_index = pd.date_range(df_u["ds"].max() + pd.offsets.MonthBegin(1), periods=horizon, freq="MS")
+        monthly = pd.DataFrame({
+            "ds": future_index,
+            "yhat": media,
+            "yhat_lower": media,
+            "yhat_upper": media,
+        })
+        monthly = monthly[monthly["ds"].dt.year == 2025]
+        return uf, float(monthly["yhat"].sum()), monthly
+    data_hash = hashlib.sha1(pd.util.hash_pandas_object(df_u, index=False).values.tobytes()).hexdigest()[:12]
+    cache_path = os.path.join(_PROPHET_CACHE_DIR, f"{uf}_{data_hash}.json")
+    model = _MODEL_MEMO.get((uf, data_hash))
+    if model is None:
+        if os.path.exists(cache_path):
+            with open(cache_path) as f:
+                model = model_from_json(f.read())
+        else:
+            # Série mensal: sazonalidade semanal/diária só adiciona custo; 200
+            # amostras de incerteza bastam para a banda exibida no gráfico
+            model = Prophet(
+                holidays=feriados,
+                weekly_seasonality=False,
+                daily_seasonality=False,
+                mcmc_samples=0,
+                uncertainty_samples=200,
+            )
+            model.fit(df_u)
+            os.makedirs(_PROPHET_CACHE_DIR, exist_ok=True)
+            with open(cache_path, "w") as f:
+                f.write(model_to_json(model))
+        _MODEL_MEMO[(uf, data_hash)] = model
+    # Prever só os meses futuros: evita re-prever o histórico inteiro
+    # que make_future_dataframe incluiria
+    last_date = df_u["ds"].max()
+    future = pd.DataFrame({
+        "ds": pd.date_range(last_date + pd.offsets.MonthBegin(1), periods=horizon, freq="MS")
+    })
+    forecast_future = model.predict(future)
+    # Uma única máscara de 2025, reutilizada pela soma e pelo mensal
+    # (dt.year aloca um array novo a cada chamada)
+    f2025 = forecast_future[forecast_future["ds"].dt.year.values == 2025]
+    # Guardar também a banda de incerteza para reuso no gráfico por UF;
+    # float32 basta para plotar e corta o payload/cache pela metade
+    monthly = f2025[["ds","yhat","yhat_lower","yhat_upper"]].astype(
+        {"yhat": "float32", "yhat_lower": "float32", "yhat_upper": "float32"}
+    )
+    return uf, float(f2025["yhat"].sum()), monthly
+
+# persist="disk": a entrada é apenas frames pequenos (float32, poucas
+# linhas), então projeções sobrevivem a restarts do container; dados
+# novos da planilha mudam a chave do cache e invalidam sozinhos.
+@st.cache_data(
+    ttl=86400,
+    persist="disk",
+    max_entries=64,
+    show_spinner="Ajustando modelos de projeção (apenas na primeira vez)...",
+)
+def compute_projection_all(df, horizon, feriados):
+    # Fits independentes por UF -> paralelizados entre os núcleos.
+    # O cache continua no nível do lote: reruns não refazem nada.
+    groups = {uf: g[["ds","y"]] for uf, g in df.groupby("UF", sort=False, observed=True)}
+    if not groups:
+        return {}, {}
+    results = Parallel(
+        n_jobs=min(len(groups), os.cpu_count()),
+        backend="loky",
+        batch_size="auto",
+    )(delayed(_fit_one)(uf, df_u, horizon, feriados) for uf, df_u in groups.items())
     proj = {}
     monthly = {}
-    for uf in all_uf:
-        df_u = df[(df["UF"] == uf)][["ds","y"]].copy()
-        if df_u.empty:
-            proj[uf] = 0.0
-            monthly[uf] = pd.DataFrame(columns=['ds','yhat'])
-            continue
-        df_u["y"] = df_u["y"].astype(float)
-        model = Prophet(holidays=feriados)
-        model.fit(df_u)
-        last_date = df_u["ds"].max()
-        future = model.make_future_dataframe(periods=horizon, freq="MS")
-        forecast = model.predict(future)
-        forecast_future = forecast[forecast["ds"] > last_date]
-        yhat_2025 = forecast_future[forecast_future["ds"].dt.year == 2025]["yhat"].sum() if not forecast_future.empty else 0.0
-        proj[uf] = float(yhat_2025)
-        monthly[uf] = forecast_future[forecast_future["ds"].dt.year == 2025][["ds","yhat"]].copy()
+    for uf, yhat_2025, monthly_uf in results:
+        proj[uf] = yhat_2025
+        monthly[uf] = monthly_uf
     return proj, monthly
 
-# Projeção total por UF (pré-calc) com cache
-all_ufs = sorted(df["UF"].dropna().unique())
-if "proj_2025_by_all" not in st.session_state:
-    st.session_state["proj_2025_by_all"], st.session_state["monthly_2025_by_uf_all"] = compute_projection_all(all_ufs, horizon, feriados)
-proj_2025_by_all = st.session_state.get("proj_2025_by_all", {})
-monthly_2025_by_uf_all = st.session_state.get("monthly_2025_by_uf_all", {})
+# Botão de recálculo: limpa só o cache do lote — os fits em si voltam
+# do disco (.prophet_cache), então o refresh custa os predicts apenas
+if st.sidebar.button("Recalcular projeções"):
+    compute_projection_all.clear()
+
+# Projeção por UF com cache: todas as UFs só quando o ranking nacional
+# é pedido; no caminho comum apenas as UFs selecionadas são ajustadas
+all_ufs = ufs
+df_proj = df if calc_ranking else df[df["UF"].isin(ufs_selected)]
+proj_2025_by_all, monthly_2025_by_uf_all = compute_projection_all(df_proj, horizon, feriados)
+
+# ------------------------
+# Totais anuais por UF (uma única passada vetorizada, usada nos resumos)
+# ------------------------
+totais_ano_uf = df.groupby(["UF", "Year"], sort=False, observed=True)["y"].sum().unstack(fill_value=0)
 
 # ------------------------
 # Histórico por UF + Projeção por UF
 # ------------------------
 st.subheader("Histórico e Projeção por UF (selecionadas)")
-for uf in ufs_selected:
-    df_prophet = df[(df["UF"] == uf)][["ds","y"]].copy().sort_values("ds")
-    if df_prophet.empty:
-        continue
+@st.fragment
+def render_uf(uf):
+    # Fragmento: interações aqui dentro re-renderizam só esta UF, sem
+    # reexecutar o script (nem retransmitir os gráficos das outras)
+    df_prophet = uf_groups.get(uf)
+    if df_prophet is None or df_prophet.empty:
+        return
 
-    # Garantir que y seja inteiro
-    df_prophet["y"] = df_prophet["y"].astype(int)
+    # Garantir que y seja inteiro (sem mutar o slice compartilhado)
+    df_prophet = df_prophet.assign(y=df_prophet["y"].astype(int))
 
-    # Construir modelo e previsão
-    model = Prophet(holidays=feriados)
-    model.fit(df_prophet.rename(columns={"ds":"ds","y":"y"}))
-    last_date = df_prophet["ds"].max()
-    future = model.make_future_dataframe(periods=horizon, freq="MS")
-    forecast = model.predict(future)
-    forecast_future = forecast[forecast["ds"] > last_date]
+    # O fit usou a série completa (compute_projection_all); só o recorte
+    # exibido do histórico segue o período escolhido na sidebar
+    janela = (df_prophet["ds"] >= start_ts) & (df_prophet["ds"] <= end_ts)
+    df_hist = df_prophet[janela]
+
+    # Reutilizar a previsão do pré-calc (já ajustada em compute_projection_all)
+    forecast_future = monthly_2025_by_uf_all.get(uf)
+    if forecast_future is None:
+        forecast_future = pd.DataFrame(columns=["ds","yhat","yhat_lower","yhat_upper"])
 
     # Reforçar inteiros no forecast
     if not forecast_future.empty:
-        forecast_future["yhat"] = forecast_future["yhat"].round().astype(int)
-        forecast_future["yhat_lower"] = forecast_future["yhat_lower"].round().astype(int)
-        forecast_future["yhat_upper"] = forecast_future["yhat_upper"].round().astype(int)
+        forecast_future = forecast_future.assign(
+            yhat=forecast_future["yhat"].round().astype(int),
+            yhat_lower=forecast_future["yhat_lower"].round().astype(int),
+            yhat_upper=forecast_future["yhat_upper"].round().astype(int),
+        )
 
     # Gráfico único com histórico + projeção (2 traces) + banda
-    fig = go.Figure()
+    # FigureResampler (LTTB) manda ao navegador só os pontos visíveis,
+    # mantendo o custo de renderização constante se a série crescer
+    fig = FigureResampler(go.Figure(), default_n_shown_samples=2000)
 
     # Histórico
-    fig.add_trace(go.Scatter(
-        x=df_prophet["ds"],
-        y=df_prophet["y"],
+    fig.add_trace(go.Scattergl(
+        x=df_hist["ds"],
+        y=df_hist["y"],
         mode="lines",
         name="Histórico",
         hovertemplate="Data: %{x|%b/%Y}<br>Reservas: %{y:.0f}"
@@ -149,7 +310,7 @@ for uf in ufs_selected:
 
     # Projeção 2025
     if not forecast_future.empty:
-        fig.add_trace(go.Scatter(
+        fig.add_trace(go.Scattergl(
             x=forecast_future["ds"],
             y=forecast_future["yhat"],
             mode="lines",
@@ -157,7 +318,7 @@ for uf in ufs_selected:
             hovertemplate="Data: %{x|%b/%Y}<br>Projeção 2025: %{y:.0f}"
         ))
         # Banda de incerteza ( Superior e Inferior )
-        fig.add_trace(go.Scatter(
+        fig.add_trace(go.Scattergl(
             x=forecast_future["ds"],
             y=forecast_future["yhat_upper"],
             mode="lines",
@@ -165,7 +326,7 @@ for uf in ufs_selected:
             name="Intervalo Superior 2025",
             hovertemplate="Data: %{x|%b/%Y}<br>Superior: %{y:.0f}"
         ))
-        fig.add_trace(go.Scatter(
+        fig.add_trace(go.Scattergl(
             x=forecast_future["ds"],
             y=forecast_future["yhat_lower"],
             mode="lines",
@@ -183,30 +344,57 @@ for uf in ufs_selected:
         yaxis=dict(tickformat="d"),  # inteiros no eixo
         hovermode="closest"
     )
-    st.plotly_chart(fig, use_container_width=True)
+    # theme=None evita a repintura do tema do Streamlit sobre a figura
+    st.plotly_chart(fig, use_container_width=True, theme=None)
 
     # Tabela de Projeção 2025 (se houver)
     if not forecast_future.empty:
-        forecast_table = forecast_future[["ds","yhat","yhat_lower","yhat_upper"]].copy()
-        forecast_table["Mês/Ano"] = forecast_table["ds"].apply(lambda d: mes_br_port(pd.Timestamp(d)))
-        forecast_table.rename(columns={
+        forecast_table = forecast_future[["ds","yhat","yhat_lower","yhat_upper"]].assign(
+            **{"Mês/Ano": mes_br_port(forecast_future["ds"])}
+        ).rename(columns={
             "yhat": "Previsão 2025",
             "yhat_lower": "Intervalo Inferior 2025",
             "yhat_upper": "Intervalo Superior 2025"
-        }, inplace=True)
-        forecast_table["Mês/Ano"] = forecast_table["ds"].apply(lambda d: mes_br_port(d))
-        st.dataframe(forecast_table[["Mês/Ano","Previsão 2025","Intervalo Inferior 2025","Intervalo Superior 2025"]])
+        })
+
+        # % vs média histórica do mesmo mês: um pivô mês x ano + map por
+        # mês, tudo vetorizado (sem laço por linha)
+        hist_mes = df_prophet.assign(
+            m=df_prophet["ds"].dt.month, ano=df_prophet["ds"].dt.year
+        ).pivot_table(index="m", columns="ano", values="y", aggfunc="mean")
+        meses = forecast_future["ds"].dt.month
+        for ano in (2023, 2024):
+            if ano in hist_mes.columns:
+                base = meses.map(hist_mes[ano]).replace(0, np.nan)
+                forecast_table[f"Vs {ano} (%)"] = (
+                    (forecast_future["yhat"] - base) / base * 100
+                ).round(1).values
+
+        table_cols = ["Mês/Ano", "Previsão 2025", "Intervalo Inferior 2025", "Intervalo Superior 2025"]
+        table_cols += [c for c in forecast_table.columns if c.startswith("Vs ")]
+        # Formatação no cliente (column_config): nenhum trabalho Python
+        # por célula, qualquer que seja o tamanho da tabela
+        st.dataframe(
+            forecast_table[table_cols],
+            column_config={
+                "Previsão 2025": st.column_config.NumberColumn(format="%d"),
+                "Intervalo Inferior 2025": st.column_config.NumberColumn(format="%d"),
+                "Intervalo Superior 2025": st.column_config.NumberColumn(format="%d"),
+                **{c: st.column_config.NumberColumn(format="%.1f%%")
+                   for c in table_cols if c.startswith("Vs ")},
+            },
+        )
 
         st.download_button(
             label="Exportar Projeção 2025 (CSV)",
-            data=forecast_table[["Mês/Ano","Previsão 2025","Intervalo Inferior 2025","Intervalo Superior 2025"]].to_csv(index=False).encode('utf-8'),
+            data=forecast_table[table_cols].to_csv(index=False).encode('utf-8'),
             file_name=f"projecao_2025_{uf}.csv",
             mime="text/csv"
         )
 
     # Resumo da UF (opcional)
-    total_2023_uf = int(df[(df["UF"] == uf) & (df["ds"].dt.year == 2023)]['y'].sum())
-    total_2024_uf = int(df[(df["UF"] == uf) & (df["ds"].dt.year == 2024)]['y'].sum())
+    total_2023_uf = int(totais_ano_uf.at[uf, 2023]) if 2023 in totais_ano_uf.columns else 0
+    total_2024_uf = int(totais_ano_uf.at[uf, 2024]) if 2024 in totais_ano_uf.columns else 0
     proj_uf_2025 = int(proj_2025_by_all.get(uf, 0.0))
     st.markdown(f"Resumo da UF {uf}:")
     colA, colB, colC = st.columns(3)
@@ -217,6 +405,48 @@ for uf in ufs_selected:
     with colC:
         st.metric(label="Projeção 2025 (UF)", value=str(proj_uf_2025))
 
+for uf in ufs_selected:
+    render_uf(uf)
+
+# ------------------------
+# Ranking Geral de UFs (executado x projetado)
+# ------------------------
+# Construído direto do pivô anual + projeções, tudo vetorizado
+# (sem laço Python por UF). Só roda quando o checkbox da sidebar pede,
+# evitando os fits de todas as UFs no caminho comum
+if calc_ranking:
+    ranking_all = totais_ano_uf.reindex(all_ufs).fillna(0)
+    for ano in (2023, 2024):
+        if ano not in ranking_all.columns:
+            ranking_all[ano] = 0
+    ranking_all = ranking_all[[2023, 2024]].astype(int).rename(
+        columns={2023: "2023 (Executado)", 2024: "2024 (Executado)"}
+    ).reset_index()
+    ranking_all["2025 (Projetado)"] = ranking_all["UF"].map(proj_2025_by_all).fillna(0).round().astype(int)
+    # As três quedas + máximo por linha em uma única passada NumPy,
+    # sem as Series temporárias de cada (a - b).clip(lower=0)
+    vals = ranking_all[["2023 (Executado)", "2024 (Executado)", "2025 (Projetado)"]].to_numpy()
+    quedas = np.maximum(0, np.stack([
+        vals[:, 0] - vals[:, 1],
+        vals[:, 0] - vals[:, 2],
+        vals[:, 1] - vals[:, 2],
+    ], axis=1))
+    ranking_all[["Queda 2024/2023 (Real)", "Queda 2025/2023 (Proj)", "Queda 2025/2024 (Proj)"]] = quedas
+    ranking_all["Máxima Queda (Proj)"] = quedas.max(axis=1)
+
+    st.subheader("Ranking Geral de UFs")
+    st.dataframe(ranking_all.sort_values("2025 (Projetado)", ascending=False), use_container_width=True)
+
+    # UF com a maior queda projetada direto do vetor (idxmax), em vez de
+    # um max(dict, key=...) em Python
+    if not ranking_all.empty:
+        i_max = ranking_all["Máxima Queda (Proj)"].idxmax()
+        st.metric(
+            label="UF com maior queda projetada",
+            value=str(ranking_all.at[i_max, "UF"]),
+            delta=-int(ranking_all.at[i_max, "Máxima Queda (Proj)"]),
+        )
+
 # ------------------------
 # Explicação do modelo
 # ------------------------